@@ -1,67 +1,582 @@
 import requests
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.utils import requote_uri
+from urllib3.util.retry import Retry
+from urllib3.util.connection import create_connection, allowed_gai_family
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlparse, urlsplit, urljoin
+from urllib.robotparser import RobotFileParser
+from html import unescape
+from lxml import etree, html as lxml_html
+from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from functools import lru_cache
 import threading
-import difflib
+import re
+import time
+import json
+import sqlite3
+import math
+import hashlib
+import os
+import multiprocessing
+import sys
+import socket
 
-class LinkChecker:
-    def __init__(self, start_url, max_workers=4):
-        self.base_url = self.normalize_url(start_url)
-        self.base_domain = urlparse(start_url).netloc
-        self.homepage_features = self.get_homepage_features()
+# 需要下载正文并提取链接的内容类型
+PARSEABLE_TYPES = ('text/html', 'application/xhtml', 'application/xml', 'text/xml')
+
+# 按XML解析<loc>的内容类型（站点地图），其余按HTML提取<a href>
+XML_TYPES = frozenset({'application/xml', 'text/xml'})
+
+# 默认不检测的静态资源后缀，入队前直接过滤，不发任何请求
+SKIP_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.css', '.js',
+    '.pdf', '.zip', '.tar', '.gz', '.mp4', '.mp3', '.woff', '.woff2', '.ttf'
+})
+
+# 单个页面正文的下载上限，超出部分直接丢弃
+MAX_BODY_SIZE = 2 * 1024 * 1024
+
+# 缓存库至少每隔这么多秒提交一次
+CACHE_COMMIT_INTERVAL = 30
+
+# 关闭响应时剩余正文不超过该大小则读完，保留长连接
+DRAIN_SIZE = 64 * 1024
+
+# 小于该大小的页面解析耗时还不及进程间传输，始终在工作线程中解析
+POOL_MIN_SIZE = 64 * 1024
+
+# 通常是网页的路径后缀，直接GET，省去一次HEAD往返
+PAGE_EXTENSIONS = {'', '.html', '.htm', '.xhtml', '.php', '.asp', '.aspx', '.jsp', '.xml'}
+
+# 页面分词，用于计算SimHash指纹
+TOKEN_RE = re.compile(r'\w+')
+
+# 快速提取<a href>，跳过纯锚点链接
+HREF_RE = re.compile(rb'<a\b[^>]*?\bhref\s*=\s*["\']([^"\'#>\s]+)', re.IGNORECASE)
+
+# 页面声明的<base href>，相对地址以它为基准解析
+BASE_RE = re.compile(rb'<base\b[^>]*?\bhref\s*=\s*["\']([^"\'#>\s]+)', re.IGNORECASE)
+
+def parse_links(chunks, content_type):
+    """提取页面中的链接地址（模块级函数，可提交到进程池执行）
+
+    chunks为正文字节块的可迭代对象，HTML边读取边扫描，读过的内容即可丢弃
+    """
+    # 按媒体类型整体比较，不做子串匹配
+    if content_type.partition(';')[0].strip() in XML_TYPES:
+        return parse_xml_links(chunks)
+    return scan_hrefs(chunks)
+
+def scan_hrefs(chunks):
+    """逐块扫描HTML中的<a href>，正则无结果时交给lxml兜底"""
+    hrefs = []
+    base = None
+    # 找到第一个链接前暂存已读内容，留作lxml兜底解析
+    pending = []
+    tail = b''
+    for chunk in chunks:
+        if pending is not None:
+            pending.append(chunk)
+        data = tail + chunk
+        # 最后一个'<'之后可能是被截断的标签，留到下一块拼接后再扫描
+        cut = data.rfind(b'<')
+        if cut < 0:
+            cut = len(data)
+        if base is None:
+            base = BASE_RE.search(data, 0, cut)
+        hrefs.extend(m.group(1) for m in HREF_RE.finditer(data, 0, cut))
+        tail = data[cut:]
+        if hrefs:
+            pending = None
+    if base is None:
+        base = BASE_RE.search(tail)
+    hrefs.extend(m.group(1) for m in HREF_RE.finditer(tail))
+    
+    if hrefs:
+        hrefs = [decode_href(href) for href in hrefs]
+    else:
+        # 未匹配到时可能是不规范的HTML，直接用lxml解析兜底
+        try:
+            tree = lxml_html.fromstring(b''.join(pending))
+        except etree.ParserError:
+            # 空文档
+            return []
+        hrefs = [str(href) for href in tree.xpath('//a/@href')]
+        
+    # 存在<base href>时先相对它解析，得到的地址再由调用方相对页面地址解析
+    if base is not None:
+        base = decode_href(base.group(1))
+        hrefs = [urljoin(base, href) for href in hrefs]
+    return hrefs
+
+def decode_href(raw):
+    """解码正则提取的原始字节地址，还原&amp;等字符实体"""
+    href = raw.decode('utf-8', 'ignore')
+    return unescape(href) if '&' in href else href
+
+def parse_xml_links(chunks):
+    """增量解析站点地图等XML文档，链接位于<loc>节点"""
+    # recover模式可容忍格式不规范的文档
+    parser = etree.XMLPullParser(events=('end',), tag='{*}loc', recover=True)
+    links = []
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            collect_locs(parser, links)
+        parser.close()
+    except etree.XMLSyntaxError:
+        # 空文档
+        pass
+    collect_locs(parser, links)
+    return links
+
+def collect_locs(parser, links):
+    """收集已解析出的<loc>节点，并释放处理过的节点"""
+    for _, elem in parser.read_events():
+        if elem.text:
+            links.append(elem.text.strip())
+        elem.clear()
+        # 删除之前已处理完的<url>节点，大型站点地图内存占用保持平稳；
+        # <loc>直接位于根节点下时没有可删的兄弟节点（根节点前的注释、处理指令不能删）
+        parent = elem.getparent()
+        if parent is None or parent.getparent() is None:
+            continue
+        while parent.getprevious() is not None:
+            del parent.getparent()[0]
+
+@lru_cache(maxsize=1024)
+def lookup_host(host, port):
+    """解析主机的全部地址，结果在本次运行内缓存；与urllib3一样按allowed_gai_family过滤IPv4/IPv6
+
+    解析失败也缓存为空元组，重试和新建连接时不再重复查询
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+    except OSError:
+        return ()
+    return tuple(sockaddr[:2] for _, _, _, _, sockaddr in infos)
+
+class CachedDNSMixin:
+    """新建连接时直接连接缓存的地址
+
+    连接对象的主机名保持不变，Host请求头、SNI和证书校验仍使用原主机名，
+    缓存的地址只用于建立TCP连接
+    """
+    def _new_conn(self):
+        addresses = lookup_host(self._dns_host.strip('[]'), self.port)
+        if not addresses:
+            # 解析失败交给urllib3按正常流程解析并报错；解析服务临时故障时也能由这次查询恢复
+            return super()._new_conn()
+            
+        # 依次尝试各个地址，某个A/AAAA记录不通时换下一个，与urllib3的行为一致
+        err = None
+        for address in addresses:
+            try:
+                sock = create_connection(
+                    address,
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options
+                )
+            except OSError as e:
+                err = e
+                continue
+            sys.audit('http.client.connect', self, self.host, self.port)
+            return sock
+            
+        # 异常类型与urllib3自身建连失败时一致，requests才能照常映射为ConnectTimeout/ConnectionError
+        if isinstance(err, socket.timeout):
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from err
+        raise NewConnectionError(self, f"Failed to establish a new connection: {err}") from err
+
+class CachedDNSHTTPConnection(CachedDNSMixin, HTTPConnection):
+    pass
+
+class CachedDNSHTTPSConnection(CachedDNSMixin, HTTPSConnection):
+    pass
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+class CachedDNSAdapter(HTTPAdapter):
+    """每个主机只查询一次DNS的适配器，连接池淘汰重建连接时不再重复解析"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CachedDNSHTTPConnectionPool,
+            'https': CachedDNSHTTPSConnectionPool,
+        }
+
+class TokenBucket:
+    """令牌桶：平均每秒rate个请求，空闲时积攒的令牌最多允许capacity个请求连发"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'lock')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
         self.lock = threading.Lock()
-        self.visited = set()
+
+    def reserve(self):
+        """预支一个令牌，返回需要等待的秒数；令牌不足时记为欠账，按先来后到排队"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        """取得令牌，必要时在锁外等待"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+class BloomFilter:
+    """可扩容的布隆过滤器，用于超大站点的已访问判重
+
+    每个URL只占十几个比特，代价是约error_rate比例的新链接被误判为已访问而漏检。
+    写满后追加容量翻倍、误判率减半的新分片，总误判率不超过2*error_rate。
+    """
+    __slots__ = ('slices', 'lock')
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.slices = []
+        self.lock = threading.Lock()
+        self.add_slice(capacity, error_rate)
+
+    def add_slice(self, capacity, error_rate):
+        """追加一个分片：(位图, 位数, 哈希个数, 容量, 已写入数, 误判率)"""
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        self.slices.append([bytearray((bits + 7) // 8), bits, hashes, capacity, 0, error_rate])
+
+    def hash_pair(self, item):
+        """计算双重哈希的两个基础值，每个URL只计算一次，各分片共用"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def contains(self, h1, h2):
+        for bitmap, bits, hashes, _, _, _ in self.slices:
+            # 逐位检查，遇到未置位的比特立即换下一个分片
+            for i in range(hashes):
+                p = (h1 + i * h2) % bits
+                if not bitmap[p >> 3] & (1 << (p & 7)):
+                    break
+            else:
+                return True
+        return False
+
+    def insert(self, h1, h2):
+        current = self.slices[-1]
+        if current[4] >= current[3]:
+            self.add_slice(current[3] * 2, current[5] / 2)
+            current = self.slices[-1]
+        bitmap, bits, hashes = current[0], current[1], current[2]
+        for i in range(hashes):
+            p = (h1 + i * h2) % bits
+            bitmap[p >> 3] |= 1 << (p & 7)
+        current[4] += 1
+
+    # 公开方法都在锁内读写位图：insert会修改分片计数并可能追加分片
+    def __contains__(self, item):
+        h1, h2 = self.hash_pair(item)
+        with self.lock:
+            return self.contains(h1, h2)
+
+    def add(self, item):
+        h1, h2 = self.hash_pair(item)
+        with self.lock:
+            self.insert(h1, h2)
+
+    def setdefault(self, item, default):
+        """与dict.setdefault用法一致：首次加入时返回default，已存在时返回True"""
+        # 哈希在锁外计算，锁内只做位运算
+        h1, h2 = self.hash_pair(item)
+        with self.lock:
+            if self.contains(h1, h2):
+                return True
+            self.insert(h1, h2)
+            return default
+
+class LinkChecker:
+    # 固定属性布局，实例不再携带__dict__
+    __slots__ = (
+        'base_url', 'base_domain', 'internal_roots', 'internal_prefixes',
+        'visited', 'dead_links', 'task_queue', 'max_workers', 'retries', 'backoff',
+        'host_rate', 'host_burst', 'host_buckets', 'host_lock', 'robots',
+        'cache_ttl', 'cache_lock', 'cache_writes', 'cache_commit_ts', 'cache',
+        'parse_processes', 'parse_pool', 'skip_extensions', 'stopping', 'session', 'homepage_hash'
+    )
+
+    def __init__(self, start_url, max_workers=16, host_rate=4, host_burst=8,
+                 cache_path='deadlink_cache.db', cache_ttl=86400, bloom_capacity=None,
+                 parse_processes=None, skip_extensions=SKIP_EXTENSIONS, retries=2, backoff=0.5):
+        self.base_url = sys.intern(self.normalize_url(start_url))
+        self.base_domain = urlparse(start_url).netloc.lower()
+        # 站内链接前缀，带上分隔符以免误匹配 example.com.evil.org 之类的域名
+        self.internal_roots = (f'http://{self.base_domain}', f'https://{self.base_domain}')
+        self.internal_prefixes = tuple(root + sep for root in self.internal_roots for sep in '/?#')
+        # 默认用dict精确判重；指定bloom_capacity时改用布隆过滤器，以少量漏检换取内存
+        self.visited = BloomFilter(bloom_capacity) if bloom_capacity else {}
+        self.visited.setdefault(self.base_url, None)
         self.dead_links = []
-        self.task_queue = deque([self.base_url])
+        self.task_queue = Queue()
+        self.task_queue.put(self.base_url)
         self.max_workers = max_workers
-        self.session = requests.Session()
-        self.session.headers.update({
+        # 临时错误的重试次数和退避系数，不同检测策略通过参数调整，无需派生子类
+        self.retries = retries
+        self.backoff = backoff
+        # 每个主机平均每秒最多host_rate个请求，为None时不限速（robots.txt的Crawl-delay仍生效）
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.host_buckets = {}
+        self.host_lock = threading.Lock()
+        self.robots = {}
+        self.cache_ttl = cache_ttl
+        self.cache_lock = threading.Lock()
+        self.cache_writes = 0
+        self.cache_commit_ts = time.time()
+        self.cache = self.open_cache(cache_path)
+        # 解析进程数，None表示在工作线程中直接解析，True表示与CPU核数相同
+        self.parse_processes = parse_processes
+        self.parse_pool = None
+        # 传入空集合可检测所有链接，包括图片、下载文件等
+        self.skip_extensions = skip_extensions
+        # 中断后置位，工作线程跳过队列中剩余的链接
+        self.stopping = False
+        self.session = self.create_session()
+        self.homepage_hash = self.get_homepage_hash()
+        self.load_robots(self.base_url)
+
+    def create_session(self):
+        """创建复用连接池的会话，所有工作线程共享"""
+        session = requests.Session()
+        session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept-Language': 'en-US,en;q=0.9'
+            'Accept-Language': 'en-US,en;q=0.9',
+            # 优先返回网页，其他类型只需状态码
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.1'
         })
+        # 连接池上限与线程数对齐，避免超出的连接被丢弃后重新握手；
+        # 网关类临时错误和限流由urllib3退避重试，重试用尽后返回最后的响应按状态码判定；
+        # 不按Retry-After等待：服务器可能要求等上几小时，工作线程会被长时间占住，还绕过了主机限速
+        adapter = CachedDNSAdapter(
+            pool_connections=16,
+            pool_maxsize=max(self.max_workers, 10),
+            max_retries=Retry(
+                total=self.retries,
+                backoff_factor=self.backoff,
+                status_forcelist=[429, 502, 503, 504],
+                respect_retry_after_header=False,
+                raise_on_status=False
+            )
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
-    def normalize_url(self, url):
-        """标准化URL格式"""
+    def open_cache(self, path):
+        """打开检测结果缓存库，跨次运行跳过近期检测过的链接；path为None时不缓存"""
+        if path is None:
+            return None
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS urls(url TEXT PRIMARY KEY, status INT, '
+            'checked_ts REAL, etag TEXT, last_mod TEXT, links TEXT)'
+        )
+        return conn
+
+    def cache_get(self, url):
+        """查询链接的上次检测结果"""
+        if self.cache is None:
+            return None
+        with self.cache_lock:
+            row = self.cache.execute('SELECT * FROM urls WHERE url=?', (url,)).fetchone()
+        if row is None:
+            return None
+        cached = dict(row)
+        cached['links'] = json.loads(cached['links'])
+        return cached
+
+    def cache_put(self, url, status, etag, last_mod, links):
+        """记录正常链接的检测结果，每500条或每隔CACHE_COMMIT_INTERVAL秒提交一次
+
+        已提交的结果即为断点：进程意外退出后重新运行，有效期内的页面直接沿用缓存的链接，
+        不重新请求，很快就能回到中断前的进度
+        """
+        if self.cache is None:
+            return
+        with self.cache_lock:
+            self.cache.execute(
+                'INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?)',
+                (url, status, time.time(), etag, last_mod, json.dumps(links))
+            )
+            self.cache_writes += 1
+            now = time.time()
+            # 慢速站点长时间凑不满500条，按时间兜底，意外退出最多丢失最近一段时间的结果
+            if self.cache_writes >= 500 or now - self.cache_commit_ts >= CACHE_COMMIT_INTERVAL:
+                self.cache.commit()
+                self.cache_writes = 0
+                self.cache_commit_ts = now
+
+    def close_cache(self):
+        """提交剩余结果并关闭缓存库"""
+        if self.cache is not None:
+            with self.cache_lock:
+                self.cache.commit()
+                self.cache.close()
+
+    def conditional_headers(self, cached):
+        """根据缓存的ETag/Last-Modified构造条件请求头"""
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_mod']:
+                headers['If-Modified-Since'] = cached['last_mod']
+        return headers
+
+    def is_internal_link(self, url):
+        """判断绝对地址是否属于本站，只做前缀比较，不解析URL"""
+        if url.startswith(self.internal_prefixes) or url in self.internal_roots:
+            return True
+        # 协议和域名不区分大小写，少数带大写字母的写法再按小写比较一次
+        lowered = url.lower()
+        return lowered != url and (lowered.startswith(self.internal_prefixes) or lowered in self.internal_roots)
+
+    def wait_for_host(self, url):
+        """按主机令牌桶限速，只在该主机请求过快时等待，不影响其他主机"""
+        host = self.get_netloc(url)
+        with self.host_lock:
+            bucket = self.host_buckets.get(host)
+            if bucket is None and self.host_rate:
+                bucket = self.host_buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+                
+        if bucket is not None:
+            bucket.acquire()
+
+    def request(self, method, url, **kwargs):
+        """经主机限速后发送请求"""
+        self.wait_for_host(url)
+        return self.session.request(method, url, **kwargs)
+
+    def load_robots(self, url):
+        """下载并解析主机的robots.txt，Crawl-delay并入该主机的限速间隔"""
+        parsed = urlparse(url)
+        host = parsed.netloc
+        rp = RobotFileParser(f"{parsed.scheme}://{host}/robots.txt")
+        try:
+            resp = self.request('GET', rp.url, timeout=10)
+            if resp.status_code in (401, 403):
+                rp.disallow_all = True
+            elif resp.status_code >= 400:
+                rp.allow_all = True
+            else:
+                rp.parse(resp.text.splitlines())
+        except requests.exceptions.RequestException as e:
+            print(f"robots.txt获取失败: {host} - {str(e)}")
+            rp.allow_all = True
+            
+        # Crawl-delay要求更慢时替换该主机的令牌桶，且不允许连发
+        delay = rp.crawl_delay('*')
+        with self.host_lock:
+            if delay and (not self.host_rate or 1 / float(delay) < self.host_rate):
+                self.host_buckets[host] = TokenBucket(1 / float(delay), 1)
+            self.robots[host] = rp
+        return rp
+
+    def allowed(self, url):
+        """检查robots.txt是否允许抓取该链接"""
+        rp = self.robots.get(self.get_netloc(url))
+        if rp is None:
+            rp = self.load_robots(url)
+        return rp.can_fetch('*', url)
+
+    @staticmethod
+    @lru_cache(maxsize=200000)
+    def normalize_url(url):
+        """标准化URL格式（页面间导航链接大量重复，结果按LRU缓存，满后淘汰最久未用项）"""
+        # 路径中的中文等非ASCII字符按requests发送时的方式编码，
+        # 编码前后的两种写法视为同一链接；纯ASCII地址（绝大多数）跳过
+        if not url.isascii():
+            scheme, sep, rest = url.partition('://')
+            netloc, slash, path = rest.partition('/')
+            url = scheme + sep + netloc + slash + requote_uri(path)
+            
+        # 常见形式直接按字符串切分，省去urlparse和geturl的对象构造
+        # 只有协议和域名不区分大小写，路径保持原样，避免把大小写敏感的路径合并成同一个
+        if ';' not in url and url.isprintable() and url == url.strip():
+            scheme, sep, rest = url.split('#', 1)[0].split('?', 1)[0].rstrip('/').partition('://')
+            netloc, slash, path = rest.partition('/')
+            return scheme.lower() + sep + netloc.lower() + slash + path
+            
         parsed = urlparse(url)
         return parsed._replace(
+            netloc=parsed.netloc.lower(),
             path=parsed.path.rstrip('/'),
             query='',
             fragment=''
-        ).geturl().lower()
+        ).geturl()
+
+    @staticmethod
+    @lru_cache(maxsize=200000)
+    def get_netloc(url):
+        """获取URL的域名部分（缓存同上）"""
+        return urlparse(url).netloc
 
-    def get_homepage_features(self):
-        """获取首页特征用于相似度比对"""
+    @staticmethod
+    @lru_cache(maxsize=200000)
+    def get_extension(url):
+        """获取URL路径最后一段的小写后缀（缓存同上），按字符串切分，不解析整个URL"""
+        path = url.split('#', 1)[0].split('?', 1)[0].partition('://')[2].partition('/')[2]
+        return os.path.splitext(path.rpartition('/')[2].split(';', 1)[0])[1].lower()
+
+    def get_homepage_hash(self):
+        """获取首页指纹用于相似度比对"""
         try:
-            resp = self.session.get(self.base_url, timeout=10)
-            return self.extract_features(resp.text)
+            resp = self.request('GET', self.base_url, timeout=10)
+            return self.simhash(resp.text)
         except Exception as e:
-            print(f"首页特征获取失败: {str(e)}")
-            return []
+            print(f"首页指纹获取失败: {str(e)}")
+            return None
 
-    def extract_features(self, text):
-        """提取页面特征"""
-        clean_text = text.replace('\n', ' ').strip()[:2000]
-        return [
-            len(clean_text),          # 文本长度
-            clean_text.count(' '),    # 空格数量
-            clean_text.count('<div'), # 结构特征
-            clean_text.count('href=') # 链接数量
-        ]
+    def simhash(self, text):
+        """计算页面的64位SimHash指纹，内容越相近的页面指纹汉明距离越小"""
+        weights = [0] * 64
+        for token, count in Counter(TOKEN_RE.findall(text.lower())).items():
+            h = hash(token)
+            for i in range(64):
+                weights[i] += count if (h >> i) & 1 else -count
+        return sum(1 << i for i, weight in enumerate(weights) if weight > 0)
 
     def is_similar_to_homepage(self, content):
-        """改进的相似度检测算法"""
-        if not self.homepage_features:
+        """比较页面与首页指纹的汉明距离"""
+        if self.homepage_hash is None:
             return False
             
-        current_features = self.extract_features(content)
-        similarity = difflib.SequenceMatcher(
-            None, 
-            str(self.homepage_features),
-            str(current_features)
-        ).ratio()
-        return similarity > 0.8
+        distance = bin(self.simhash(content) ^ self.homepage_hash).count('1')
+        return distance < 8
+
+    def is_homepage_url(self, url):
+        """判断地址本身是否指向首页：不区分协议，目录索引页/index.*视同其所在目录"""
+        address = self.normalize_url(url).partition('://')[2]
+        parent, _, name = address.rpartition('/')
+        if parent and name.startswith('index.'):
+            address = parent
+        return address == self.base_url.partition('://')[2]
 
     def check_redirect_chain(self, response):
         """分析重定向链有效性"""
@@ -69,9 +584,11 @@ class LinkChecker:
         if response.status_code >= 400:
             return True
             
-        # 重定向到首页且内容相似
-        if response.url == self.base_url:
-            return self.is_similar_to_homepage(response.text)
+        # 重定向到首页且内容相似；本身就指向首页的地址（http→https、/index.html→/等）不算
+        if (response.history and self.normalize_url(response.url) == self.base_url
+                and not self.is_homepage_url(response.history[0].url)):
+            body = self.read_capped(response) if self.is_parseable(response) else b''
+            return self.is_similar_to_homepage(body.decode(response.encoding or 'utf-8', 'ignore'))
             
         # 检查重定向历史
         for resp in response.history:
@@ -80,17 +597,143 @@ class LinkChecker:
                 
         return False
 
+    def is_parseable(self, response):
+        """判断响应是否为可提取链接的页面"""
+        content_type = response.headers.get('Content-Type', '').lower()
+        return content_type.startswith(PARSEABLE_TYPES)
+
+    def iter_capped(self, response, cap=MAX_BODY_SIZE):
+        """按64KB分块读取正文，累计超过上限即停止下载"""
+        received = 0
+        for chunk in response.iter_content(65536):
+            received += len(chunk)
+            if received >= cap:
+                yield chunk[:len(chunk) - (received - cap)]
+                return
+            yield chunk
+
+    def read_capped(self, response, cap=MAX_BODY_SIZE):
+        """读取完整正文（不超过上限）"""
+        return b''.join(self.iter_capped(response, cap))
+
+    def release(self, response):
+        """关闭响应，未读完的正文不大时先读完丢弃
+
+        流式响应正文没读完就关闭时连接会被直接断开，下一个请求要重新建立TCP/TLS连接；
+        404错误页等小正文读完后连接回到连接池，同一主机的请求持续复用少数几个长连接
+        """
+        remaining = response.raw.length_remaining
+        if remaining is not None and remaining <= DRAIN_SIZE:
+            response.raw.drain_conn()
+        response.close()
+
+    def looks_like_page(self, url):
+        """根据路径后缀判断链接是否大概率为网页"""
+        return self.get_extension(url) in PAGE_EXTENSIONS
+
+    def fetch(self, url, headers=None):
+        """先用HEAD探测存活，仅对可解析页面再下载正文"""
+        # 网页本来就要下载正文，直接GET，一次往返完成检测，也只占一次限速间隔
+        if self.looks_like_page(url):
+            return self.request('GET', url, headers=headers, allow_redirects=True, timeout=15, stream=True)
+            
+        resp = self.request('HEAD', url, headers=headers, allow_redirects=True, timeout=10)
+        
+        # HEAD报错时用GET复核：有的服务器不支持HEAD（405/501），有的对HEAD返回与GET不同的状态；
+        # 流式请求只取响应头，错误页正文不会被读取
+        if resp.status_code >= 400:
+            return self.request('GET', url, headers=headers, allow_redirects=True, timeout=15, stream=True)
+            
+        # 未变化的页面和图片、PDF等资源只需状态码，不下载正文
+        if resp.status_code == 304 or not self.is_parseable(resp):
+            return resp
+            
+        return self.request('GET', url, headers=headers, allow_redirects=True, timeout=15, stream=True)
+
+    def extract_links(self, response):
+        """提取页面中的链接地址，启用进程池时在子进程中解析"""
+        content_type = response.headers.get('Content-Type', '').lower()
+        # 未声明长度的页面大小未知，按大页面处理
+        size = response.headers.get('Content-Length', '')
+        if self.parse_pool is None or (size.isdigit() and int(size) < POOL_MIN_SIZE):
+            # 边下载边扫描，正文不整体驻留内存
+            return parse_links(self.iter_capped(response), content_type)
+        # 子进程无法读取响应流，需先读出完整正文
+        body = self.read_capped(response)
+        return self.parse_pool.submit(parse_links, [body], content_type).result()
+
+    def seed_from_sitemap(self):
+        """以站点地图中的URL清单补充待检测队列"""
+        rp = self.robots[self.get_netloc(self.base_url)]
+        sitemaps = rp.site_maps() or [urljoin(self.base_url, '/sitemap.xml')]
+        for sitemap in sitemaps:
+            try:
+                resp = self.request('GET', sitemap, timeout=15)
+            except requests.exceptions.RequestException as e:
+                print(f"站点地图获取失败: {sitemap} - {str(e)}")
+                continue
+            if resp.status_code < 400:
+                # 站点地图只是补充，解析出错不能中断整个检测
+                try:
+                    links = parse_xml_links([resp.content])
+                except Exception as e:
+                    print(f"站点地图解析失败: {sitemap} - {str(e)}")
+                    continue
+                self.enqueue_links(sitemap, links)
+
+    def enqueue_links(self, page_url, hrefs):
+        """将同域名下未访问过的链接加入待检测队列"""
+        parts = urlsplit(page_url)
+        page_root = f'{parts.scheme}://{parts.netloc}'
+        new_links = set()
+        for href in hrefs:
+            # 绝对地址和以根路径开头的地址占绝大多数，直接拼接；含点段、协议相对等情况交给urljoin
+            if '/.' in href or href.startswith('//'):
+                absolute_url = urljoin(page_url, href)
+            elif href.startswith(('http://', 'https://')):
+                absolute_url = href
+            elif href.startswith('/'):
+                absolute_url = page_root + href
+            else:
+                absolute_url = urljoin(page_url, href)
+            
+            # 域名校验、资源过滤和标准化
+            if self.is_internal_link(absolute_url):
+                if self.get_extension(absolute_url) in self.skip_extensions:
+                    continue
+                # 驻留字符串，已访问集合与队列共享同一份URL对象，判重时多为指针比较
+                new_links.add(sys.intern(self.normalize_url(absolute_url)))
+                
+        # dict.setdefault对字符串键在GIL下是原子操作，无需加锁：
+        # 返回本次传入的标记说明链接由当前线程首次加入
+        marker = object()
+        fresh = [link for link in new_links if self.visited.setdefault(link, marker) is marker]
+        
+        for link in fresh:
+            self.task_queue.put(link)
+            print(f"发现新链接: {link}")
+
     def process_link(self, url):
         """处理单个链接"""
         try:
             print(f"\n[处理] {url}")
             
-            # 发送请求（禁用自动重定向以手动跟踪）
-            resp = self.session.get(url, allow_redirects=True, timeout=15)
-            
-            # 检测异常链接
-            if self.check_redirect_chain(resp):
-                with self.lock:
+            # 有效期内检测过的正常链接直接复用上次结果
+            cached = self.cache_get(url)
+            if cached and time.time() - cached['checked_ts'] < self.cache_ttl:
+                self.enqueue_links(url, cached['links'])
+                return
+                
+            resp = self.fetch(url, self.conditional_headers(cached))
+            try:
+                # 页面未变化，沿用缓存的链接
+                if resp.status_code == 304 and cached:
+                    self.cache_put(url, cached['status'], cached['etag'], cached['last_mod'], cached['links'])
+                    hrefs = cached['links']
+                    
+                # 检测异常链接，异常链接不缓存，下次运行仍会重新检测
+                # list.append在GIL下是原子操作，多线程追加无需加锁
+                elif self.check_redirect_chain(resp):
                     self.dead_links.append({
                         'url': url,
                         'status': resp.status_code,
@@ -98,55 +741,91 @@ class LinkChecker:
                         'history': [r.status_code for r in resp.history]
                     })
                     print(f"!! 发现异常链接: {url}")
-            
-            # 提取页面链接
-            soup = BeautifulSoup(resp.text, 'lxml')
-            for link in soup.find_all('a', href=True):
-                absolute_url = urljoin(url, link['href'])
-                parsed_url = urlparse(absolute_url)
-                
-                # 域名校验和标准化
-                if parsed_url.netloc == self.base_domain:
-                    normalized = self.normalize_url(absolute_url)
+                    return
                     
-                    with self.lock:
-                        if normalized not in self.visited:
-                            self.visited.add(normalized)
-                            self.task_queue.append(normalized)
-                            print(f"发现新链接: {normalized}")
+                else:
+                    # 提取页面链接，图片、压缩包等大文件不下载正文
+                    # 重定向回首页时正文已在比对中读取，首页链接也已单独检测
+                    to_home = resp.history and self.normalize_url(resp.url) == self.base_url
+                    if self.is_parseable(resp) and not to_home:
+                        hrefs = self.extract_links(resp)
+                    else:
+                        hrefs = []
+                    self.cache_put(
+                        url, resp.status_code,
+                        resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                        hrefs
+                    )
+            finally:
+                self.release(resp)
+                
+            self.enqueue_links(url, hrefs)
 
         except requests.exceptions.RequestException as e:
             print(f"请求错误: {url} - {str(e)}")
-            with self.lock:
-                self.dead_links.append({
-                    'url': url,
-                    'error': str(e)
-                })
+            self.dead_links.append({
+                'url': url,
+                'error': str(e)
+            })
         except Exception as e:
             print(f"处理异常: {url} - {str(e)}")
 
+    def worker(self):
+        """工作线程：持续从待检测队列中取出链接处理，收到结束标记None后退出"""
+        while True:
+            url = self.task_queue.get()
+            try:
+                if url is None:
+                    break
+                if self.stopping:
+                    continue
+                if self.allowed(url):
+                    self.process_link(url)
+                else:
+                    print(f"robots.txt禁止抓取: {url}")
+            except Exception as e:
+                # 单个链接出错不能让线程退出，否则在途请求数会越来越少
+                print(f"处理异常: {url} - {str(e)}")
+            finally:
+                self.task_queue.task_done()
+
     def run(self):
         """启动检测任务"""
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            while True:
-                batch = []
-                
-                # 获取任务批次
-                with self.lock:
-                    if not self.task_queue:
-                        if threading.active_count() <= 1:
-                            break
-                        continue
-                        
-                    for _ in range(min(10, len(self.task_queue))):
-                        batch.append(self.task_queue.popleft())
-                
-                # 提交任务
-                futures = [executor.submit(self.process_link, url) for url in batch]
-                
-                # 等待完成
-                for future in futures:
-                    future.result()
+        # 守护线程保证中途中断时进程可以直接退出
+        workers = [threading.Thread(target=self.worker, daemon=True) for _ in range(self.max_workers)]
+        if self.parse_processes:
+            # 解析是CPU密集操作，放到独立进程绕开GIL；工作线程运行中fork不安全，用spawn启动
+            self.parse_pool = ProcessPoolExecutor(
+                max_workers=None if self.parse_processes is True else self.parse_processes,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        try:
+            # 常驻工作线程同时保持 max_workers 个请求在途，不再按批次等待最慢的链接
+            for worker in workers:
+                worker.start()
+
+            try:
+                # 工作线程已从首页开始抓取，同时在主线程下载站点地图补充队列
+                self.seed_from_sitemap()
+
+                # 队列中所有链接（包括处理中新发现的）都完成后才继续，无需轮询
+                self.task_queue.join()
+            except KeyboardInterrupt:
+                # 不再领取新链接，等进行中的请求结束后照常收尾并返回已发现的结果
+                print("\n检测已中断，等待进行中的请求结束...")
+                self.stopping = True
+
+            # 每个工作线程领取一个结束标记后退出，之后再关闭会话和缓存
+            for _ in workers:
+                self.task_queue.put(None)
+            for worker in workers:
+                worker.join()
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(cancel_futures=True)
+                self.parse_pool = None
+            self.session.close()
+            self.close_cache()
 
         return self.dead_links
 
@@ -0,0 +1,382 @@
+import unittest
+import time
+import random
+import io
+import contextlib
+from unittest import mock
+import threading
+import tempfile
+import shutil
+import subprocess
+import ssl
+import os
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, urljoin
+from queue import Queue
+
+import requests
+from lxml import etree
+
+import deadlink
+from deadlink import (
+    BloomFilter, CachedDNSAdapter, LinkChecker, collect_locs, lookup_host, parse_xml_links, scan_hrefs,
+    SKIP_EXTENSIONS
+)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """记录每个请求的Host头，正文固定为ok"""
+    def do_GET(self):
+        self.server.hosts.append(self.headers['Host'])
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """始终返回429并要求一小时后重试"""
+    def do_GET(self):
+        self.server.hits += 1
+        self.send_response(429)
+        self.send_header('Retry-After', '3600')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def cached_session():
+    session = requests.Session()
+    adapter = CachedDNSAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CachedDNSAdapterTest(unittest.TestCase):
+    """缓存DNS只能影响建立TCP连接，不能改变请求里的主机名"""
+
+    def setUp(self):
+        lookup_host.cache_clear()
+
+    def start_server(self, context=None):
+        """在本机随机端口启动测试服务器，可选包装为HTTPS，测试结束后关闭"""
+        server = HTTPServer(('127.0.0.1', 0), RecordingHandler)
+        server.hosts = []
+        if context is not None:
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_repeated_http_requests_keep_host_header(self):
+        server = self.start_server()
+        port = server.server_address[1]
+
+        with cached_session() as session:
+            for _ in range(3):
+                resp = session.get(f'http://localhost:{port}/', timeout=5)
+                self.assertEqual(resp.text, 'ok')
+
+        self.assertEqual(server.hosts, [f'localhost:{port}'] * 3)
+        # 地址确实来自缓存
+        self.assertEqual(lookup_host.cache_info().currsize, 1)
+
+    def test_failed_lookup_is_cached_and_reported(self):
+        with cached_session() as session:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    session.get('http://no-such-host.invalid/', timeout=5)
+
+        self.assertEqual(lookup_host('no-such-host.invalid', 80), ())
+        self.assertEqual(lookup_host.cache_info().misses, 1)
+
+    @unittest.skipIf(shutil.which('openssl') is None, '需要openssl生成测试证书')
+    def test_https_verifies_certificate_against_hostname(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        cert = os.path.join(tmp, 'cert.pem')
+        key = os.path.join(tmp, 'key.pem')
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+             '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+             '-addext', 'subjectAltName=DNS:localhost'],
+            check=True, capture_output=True
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server = self.start_server(context)
+        port = server.server_address[1]
+
+        # 证书只对localhost有效，SNI或校验一旦改用IP就会失败
+        with cached_session() as session:
+            for _ in range(2):
+                resp = session.get(f'https://localhost:{port}/', verify=cert, timeout=5)
+                self.assertEqual(resp.text, 'ok')
+
+        self.assertEqual(server.hosts, [f'localhost:{port}'] * 2)
+
+
+class SessionRetryTest(unittest.TestCase):
+    """限流响应只做短暂退避重试，不按Retry-After长时间等待"""
+
+    def test_retry_after_is_not_slept(self):
+        server = HTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+        server.hits = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        checker = LinkChecker.__new__(LinkChecker)
+        checker.max_workers = 4
+        checker.retries = 2
+        checker.backoff = 0.01
+        start = time.monotonic()
+        with checker.create_session() as session:
+            resp = session.get(f'http://127.0.0.1:{server.server_address[1]}/', timeout=5)
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(server.hits, 3)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+class FakeResponse:
+    def __init__(self, url, status_code=200, history=()):
+        self.url = url
+        self.status_code = status_code
+        self.history = list(history)
+        self.encoding = None
+        self.text = ''
+
+
+class StubChecker(LinkChecker):
+    """不读取正文，首页相似度比对恒为相似"""
+    __slots__ = ()
+
+    def is_parseable(self, response):
+        return False
+
+    def is_similar_to_homepage(self, content):
+        return True
+
+
+class RedirectChainTest(unittest.TestCase):
+    """重定向回首页的判定"""
+
+    def setUp(self):
+        # 不经过__init__，避免请求首页
+        self.checker = StubChecker.__new__(StubChecker)
+        self.checker.base_url = 'https://site'
+
+    def redirect(self, start, final):
+        return FakeResponse(final, history=[FakeResponse(start, 301)])
+
+    def test_homepage_aliases_are_not_dead(self):
+        for start in ('http://site/', 'https://site/index.html', 'http://site/index.php'):
+            with self.subTest(start=start):
+                self.assertFalse(self.checker.check_redirect_chain(self.redirect(start, 'https://site/')))
+
+    def test_other_page_redirected_to_homepage_is_dead(self):
+        self.assertTrue(self.checker.check_redirect_chain(self.redirect('https://site/old-post', 'https://site/')))
+
+
+class NormalizeUrlTest(unittest.TestCase):
+    """normalize_url的字符串快速路径必须与urlparse路径结果一致"""
+
+    def slow_normalize(self, url):
+        parsed = urlparse(url)
+        return parsed._replace(
+            netloc=parsed.netloc.lower(),
+            path=parsed.path.rstrip('/'),
+            query='',
+            fragment=''
+        ).geturl()
+
+    def test_fast_path_matches_urlparse(self):
+        rng = random.Random(0)
+        schemes = ['http://', 'https://', 'HTTPS://']
+        hosts = ['site.com', 'Site.COM', 'a.b:8080', 'user@Host', '[::1]:80']
+        alphabet = 'aB/?#:.%=&-_~'
+        for _ in range(20000):
+            url = (rng.choice(schemes) + rng.choice(hosts)
+                   + ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))))
+            with self.subTest(url=url):
+                self.assertEqual(LinkChecker.normalize_url.__wrapped__(url), self.slow_normalize(url))
+
+    def test_path_case_is_kept(self):
+        self.assertEqual(LinkChecker.normalize_url('HTTPS://Site.COM/Posts/Qt/?a=1#top'), 'https://site.com/Posts/Qt')
+
+
+class ScanHrefsTest(unittest.TestCase):
+    """分块扫描的结果必须与整页一次扫描一致，块边界可以落在任何位置"""
+
+    PAGE = (b'<html><head><title>t</title><base href="/docs/v2/"></head><body>'
+            b'<a class="nav" href="intro.html">Intro</a><p>text &lt; more</p>'
+            b'<A HREF=\'/abs?a=1&amp;b=2\'>Abs</A><a href="#top">Top</a>'
+            b'<a\n  href = "https://other.com/x">X</a></body></html>')
+
+    def test_every_split_offset(self):
+        whole = scan_hrefs([self.PAGE])
+        self.assertEqual(whole, ['/docs/v2/intro.html', '/abs?a=1&b=2', 'https://other.com/x'])
+        for offset in range(1, len(self.PAGE)):
+            with self.subTest(offset=offset):
+                self.assertEqual(scan_hrefs([self.PAGE[:offset], self.PAGE[offset:]]), whole)
+
+    def test_single_byte_chunks(self):
+        chunks = [self.PAGE[i:i + 1] for i in range(len(self.PAGE))]
+        self.assertEqual(scan_hrefs(chunks), scan_hrefs([self.PAGE]))
+
+    def test_lxml_fallback_for_unquoted_hrefs(self):
+        page = b'<html><body><a href=/one>1</a><p>x</p><a href=two.html>2</a></body></html>'
+        self.assertEqual(scan_hrefs([page]), ['/one', 'two.html'])
+        for offset in range(1, len(page)):
+            with self.subTest(offset=offset):
+                self.assertEqual(scan_hrefs([page[:offset], page[offset:]]), ['/one', 'two.html'])
+
+    def test_empty_page(self):
+        self.assertEqual(scan_hrefs([]), [])
+        self.assertEqual(scan_hrefs([b'']), [])
+
+
+class SitemapTest(unittest.TestCase):
+    """站点地图解析：根节点前有处理指令或注释、<loc>直接在根节点下都不能出错"""
+
+    URLSET = (b'<?xml version="1.0"?><?xml-stylesheet type="text/xsl" href="s.xsl"?><!-- gen -->'
+              b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+              + b''.join(b'<url><loc> https://site.com/%d </loc></url>' % i for i in range(50))
+              + b'</urlset>')
+
+    def test_processing_instruction_and_comment_before_root(self):
+        self.assertEqual(parse_xml_links([self.URLSET]), [f'https://site.com/{i}' for i in range(50)])
+
+    def test_loc_directly_under_root(self):
+        doc = (b'<?xml-stylesheet href="s.xsl"?><!-- gen -->'
+               b'<urlset><loc>https://site.com/a</loc><loc>https://site.com/b</loc></urlset>')
+        self.assertEqual(parse_xml_links([doc]), ['https://site.com/a', 'https://site.com/b'])
+        # 根节点本身就是<loc>
+        self.assertEqual(parse_xml_links([b'<!-- gen --><loc>https://site.com/a</loc>']), ['https://site.com/a'])
+
+    def test_handled_urls_are_pruned(self):
+        parser = etree.XMLPullParser(events=('end',), tag='{*}loc', recover=True)
+        links = []
+        for i in range(0, len(self.URLSET), 64):
+            parser.feed(self.URLSET[i:i + 64])
+            collect_locs(parser, links)
+        root = parser.close()
+        self.assertEqual(len(links), 50)
+        self.assertLessEqual(len(root), 2)
+
+    def test_bad_sitemap_does_not_abort_seeding(self):
+        checker = offline_checker('https://site.com')
+        checker.robots = {'site.com': mock.Mock(site_maps=lambda: ['https://site.com/sitemap.xml'])}
+        response = mock.Mock(status_code=200, content=b'<urlset/>')
+        with mock.patch.object(LinkChecker, 'request', return_value=response), \
+                mock.patch.object(deadlink, 'parse_xml_links', side_effect=ValueError('broken')), \
+                contextlib.redirect_stdout(io.StringIO()):
+            checker.seed_from_sitemap()
+        self.assertEqual(checker.visited, {})
+
+
+def offline_checker(start_url):
+    """只设置判定站内链接和入队所需的属性，不请求首页"""
+    checker = LinkChecker.__new__(LinkChecker)
+    checker.base_url = LinkChecker.normalize_url(start_url)
+    checker.base_domain = urlparse(start_url).netloc.lower()
+    checker.internal_roots = (f'http://{checker.base_domain}', f'https://{checker.base_domain}')
+    checker.internal_prefixes = tuple(root + sep for root in checker.internal_roots for sep in '/?#')
+    checker.visited = {}
+    checker.task_queue = Queue()
+    checker.skip_extensions = SKIP_EXTENSIONS
+    return checker
+
+
+class InternalLinkTest(unittest.TestCase):
+    """站内链接只按前缀判断，不能被形似的域名骗过"""
+
+    def setUp(self):
+        self.checker = offline_checker('https://site.com')
+
+    def test_internal(self):
+        for url in ('https://site.com/a', 'http://site.com/a', 'https://site.com',
+                    'http://site.com', 'https://site.com?page=2', 'https://site.com#top',
+                    'HTTPS://SITE.COM/A', 'https://Site.Com'):
+            with self.subTest(url=url):
+                self.assertTrue(self.checker.is_internal_link(url))
+
+    def test_lookalikes_are_external(self):
+        for url in ('https://site.com.evil/', 'https://site.com.evil', 'https://site.com@evil/',
+                    'https://site.comx/', 'https://evil/site.com', 'https://evil.com/?u=https://site.com',
+                    'ftp://site.com/', 'HTTPS://SITE.COM.EVIL/'):
+            with self.subTest(url=url):
+                self.assertFalse(self.checker.is_internal_link(url))
+
+    def test_uppercase_start_url(self):
+        checker = offline_checker('https://Site.COM/')
+        self.assertTrue(checker.is_internal_link('https://site.com/a'))
+
+
+class EnqueueLinksTest(unittest.TestCase):
+    """enqueue_links的字符串拼接必须与urljoin的解析结果一致"""
+
+    def expected(self, checker, page_url, hrefs):
+        links = set()
+        for href in hrefs:
+            url = urljoin(page_url, href)
+            if checker.is_internal_link(url) and checker.get_extension(url) not in checker.skip_extensions:
+                links.add(checker.normalize_url(url))
+        return links
+
+    def test_resolution_matches_urljoin(self):
+        rng = random.Random(0)
+        prefixes = ['', '/', './', '../', '//site.com/', '//other.com/', 'https://site.com/',
+                    'http://other.com/', '?', '#', 'sub/', '/a/./', '/a/../']
+        segments = ['a', 'B', 'x.html', 'img.png', '..', '.', 'c;p', 'q?x=1', 'f#frag']
+        pages = ['https://site.com', 'https://site.com/', 'https://site.com/docs/page.html',
+                 'https://site.com/docs/dir/', 'http://site.com/a/b?c=1']
+        for _ in range(300):
+            page_url = rng.choice(pages)
+            hrefs = [rng.choice(prefixes) + '/'.join(rng.choice(segments) for _ in range(rng.randint(0, 3)))
+                     for _ in range(20)]
+            checker = offline_checker('https://site.com')
+            with contextlib.redirect_stdout(io.StringIO()):
+                checker.enqueue_links(page_url, hrefs)
+            with self.subTest(page_url=page_url, hrefs=hrefs):
+                self.assertEqual(set(checker.visited), self.expected(checker, page_url, hrefs))
+
+
+class BloomFilterTest(unittest.TestCase):
+    """布隆过滤器在多线程并发写入时不丢失元素"""
+
+    def test_concurrent_add_and_setdefault(self):
+        bloom = BloomFilter(capacity=100)
+        items = [f'https://site/{i}' for i in range(4000)]
+
+        def add(part):
+            for item in part:
+                bloom.add(item)
+
+        def setdefault(part):
+            for item in part:
+                bloom.setdefault(item, None)
+
+        threads = [threading.Thread(target=add, args=(items[i::4],)) for i in (0, 1)]
+        threads += [threading.Thread(target=setdefault, args=(items[i::4],)) for i in (2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(item in bloom for item in items))
+        # 每个分片的写入数不超过容量（setdefault误判已存在时不写入，总数可能略少于元素数）
+        self.assertTrue(all(written <= capacity for _, _, _, capacity, written, _ in bloom.slices))
+        self.assertLessEqual(sum(written for _, _, _, _, written, _ in bloom.slices), len(items))
+
+
+if __name__ == '__main__':
+    unittest.main()